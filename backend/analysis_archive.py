@@ -0,0 +1,215 @@
+"""Bounded, deduplicating storage for analysis history.
+
+Raw inputs and results are stored once per distinct content as compressed
+blobs and shared by every analysis that refers to them. Recently used blobs
+are also kept uncompressed, by digest, in a size-bounded hot tier; others
+are decompressed on access. Every read decodes a fresh value, so callers
+never share state with the archive. A per-incident retention policy caps
+how many analyses are kept.
+"""
+import hashlib
+import json
+import zlib
+from collections import OrderedDict, defaultdict
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, List, Type
+
+from pydantic import BaseModel, BaseSettings
+
+try:
+    import zstandard
+except ImportError:  # zlib is always available
+    zstandard = None
+
+# Analysis fields stored as blobs instead of inline
+BLOB_FIELDS = ("log_data", "metrics_data", "dashboard_data", "result")
+
+ZLIB_CODEC = b"z"
+ZSTD_CODEC = b"s"
+
+
+class AnalysisArchiveSettings(BaseSettings):
+    # Bounds the uncompressed blob bytes held, not the size of the decoded
+    # objects, which for result dicts is several times larger
+    hot_tier_bytes: int = 64 * 1024 * 1024
+    max_per_incident: int = 20
+    max_analyses: int = 10000
+    compression_level: int = 3
+
+    class Config:
+        env_prefix = "SRE_ANALYSIS_"
+
+
+class _Blob:
+    __slots__ = ("data", "refs")
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.refs = 0
+
+
+class BlobStore:
+    """Reference-counted, content-addressed store of compressed blobs."""
+
+    def __init__(self, compression_level: int):
+        self.compression_level = compression_level
+        self._blobs: Dict[str, _Blob] = {}
+        if zstandard is not None:
+            self._compressor = zstandard.ZstdCompressor(level=compression_level)
+            self._decompressor = zstandard.ZstdDecompressor()
+
+    def _compress(self, raw: bytes) -> bytes:
+        if zstandard is not None:
+            return ZSTD_CODEC + self._compressor.compress(raw)
+        return ZLIB_CODEC + zlib.compress(raw, self.compression_level)
+
+    def _decompress(self, data: bytes) -> bytes:
+        codec, payload = data[:1], data[1:]
+        if codec == ZSTD_CODEC:
+            return self._decompressor.decompress(payload)
+        return zlib.decompress(payload)
+
+    def put(self, raw: bytes) -> str:
+        digest = hashlib.sha256(raw).hexdigest()
+        blob = self._blobs.get(digest)
+        if blob is None:
+            blob = self._blobs[digest] = _Blob(self._compress(raw))
+        blob.refs += 1
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        return self._decompress(self._blobs[digest].data)
+
+    def release(self, digest: str):
+        blob = self._blobs[digest]
+        blob.refs -= 1
+        if blob.refs == 0:
+            del self._blobs[digest]
+
+    def __len__(self) -> int:
+        return len(self._blobs)
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self._blobs
+
+    @property
+    def stored_bytes(self) -> int:
+        return sum(len(blob.data) for blob in self._blobs.values())
+
+
+class _ArchivedAnalysis:
+    __slots__ = ("fields", "digests")
+
+    def __init__(self, fields: Dict[str, Any], digests: Dict[str, str]):
+        self.fields = fields
+        self.digests = digests
+
+
+class AnalysisArchive(MutableMapping):
+    """Dict-like analysis history with shared compressed inputs and a hot tier.
+
+    The hot tier holds uncompressed blob bytes by digest, so analyses that
+    share inputs also share their hot copy.
+    """
+
+    def __init__(self, model: Type[BaseModel], settings: AnalysisArchiveSettings):
+        self.model = model
+        self.settings = settings
+        self.blobs = BlobStore(settings.compression_level)
+        self._records: Dict[str, _ArchivedAnalysis] = {}
+        self._by_incident: Dict[str, List[str]] = defaultdict(list)
+        self._hot: "OrderedDict[str, bytes]" = OrderedDict()
+        self._hot_bytes = 0
+
+    def _encode(self, field: str, value: Any) -> bytes:
+        if field == "result":
+            return json.dumps(value, default=str).encode()
+        return value.encode()
+
+    def _decode(self, field: str, raw: bytes) -> Any:
+        if field == "result":
+            return json.loads(raw)
+        return raw.decode()
+
+    def _cache(self, digest: str, raw: bytes):
+        if digest in self._hot:
+            self._hot.move_to_end(digest)
+            return
+        if len(raw) > self.settings.hot_tier_bytes:
+            return
+        self._hot[digest] = raw
+        self._hot_bytes += len(raw)
+        while self._hot_bytes > self.settings.hot_tier_bytes:
+            _, evicted = self._hot.popitem(last=False)
+            self._hot_bytes -= len(evicted)
+
+    def _load(self, field: str, digest: str) -> Any:
+        raw = self._hot.get(digest)
+        if raw is None:
+            raw = self.blobs.get(digest)
+        self._cache(digest, raw)
+        # Decoded on every read, so mutating a returned value cannot change the archive
+        return self._decode(field, raw)
+
+    def _release(self, digest: str):
+        self.blobs.release(digest)
+        if digest not in self.blobs and digest in self._hot:
+            self._hot_bytes -= len(self._hot.pop(digest))
+
+    def __setitem__(self, analysis_id: str, analysis: BaseModel):
+        if analysis_id in self._records:
+            del self[analysis_id]
+
+        fields = analysis.dict(exclude=set(BLOB_FIELDS))
+        digests = {}
+        for field in BLOB_FIELDS:
+            value = getattr(analysis, field)
+            if value is not None:
+                raw = self._encode(field, value)
+                digest = digests[field] = self.blobs.put(raw)
+                # Recent analyses are the likeliest to be read back
+                self._cache(digest, raw)
+
+        self._records[analysis_id] = _ArchivedAnalysis(fields, digests)
+        self._by_incident[analysis.incident_id].append(analysis_id)
+        self._apply_retention(analysis.incident_id)
+
+    def __getitem__(self, analysis_id: str) -> BaseModel:
+        record = self._records[analysis_id]
+        values = {field: self._load(field, digest) for field, digest in record.digests.items()}
+        return self.model(**record.fields, **values)
+
+    def __delitem__(self, analysis_id: str):
+        record = self._records.pop(analysis_id)
+        for digest in record.digests.values():
+            self._release(digest)
+        incident_id = record.fields["incident_id"]
+        self._by_incident[incident_id].remove(analysis_id)
+        if not self._by_incident[incident_id]:
+            del self._by_incident[incident_id]
+
+    def __contains__(self, analysis_id: object) -> bool:
+        return analysis_id in self._records
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._records))
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _apply_retention(self, incident_id: str):
+        # Analyses are appended in creation order, so the oldest come first
+        history = self._by_incident[incident_id]
+        while len(history) > self.settings.max_per_incident:
+            del self[history[0]]
+        while len(self._records) > self.settings.max_analyses:
+            del self[next(iter(self._records))]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "analyses": len(self._records),
+            "blobs": len(self.blobs),
+            "blob_bytes": self.blobs.stored_bytes,
+            "hot_blobs": len(self._hot),
+            "hot_bytes": self._hot_bytes,
+        }
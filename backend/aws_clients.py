@@ -0,0 +1,366 @@
+"""Shared async AWS client layer for Bedrock and CloudWatch.
+
+One AWSClientManager is created per process and reused by every request, so
+TLS handshakes and credential resolution happen once instead of per call.
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+from contextlib import AsyncExitStack
+from typing import Any, Dict, Optional
+
+from aiobotocore.config import AioConfig
+from aiobotocore.session import get_session
+from botocore.exceptions import (
+    ClientError,
+    ConnectionClosedError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+)
+from pydantic import BaseSettings
+
+logger = logging.getLogger(__name__)
+
+# Bedrock model ids for the analysis agents (see architecture.md)
+LOG_ANALYSIS_MODEL = "anthropic.claude-3-haiku-20240307-v1:0"
+METRICS_ANALYSIS_MODEL = "amazon.titan-text-express-v1"
+DASHBOARD_ANALYSIS_MODEL = "amazon.nova-lite-v1:0"
+SUPERVISOR_MODEL = "amazon.nova-pro-v1:0"
+
+# Error codes that are worth retrying; everything else fails immediately
+THROTTLING_ERROR_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "TooManyRequestsException",
+    "RequestLimitExceeded",
+}
+TRANSIENT_ERROR_CODES = {
+    "InternalFailure",
+    "InternalServerException",
+    "ModelNotReadyException",
+    "ServiceUnavailable",
+    "ServiceUnavailableException",
+    "RequestTimeout",
+}
+CONNECTION_ERRORS = (
+    ConnectionClosedError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+    asyncio.TimeoutError,
+)
+
+
+class AWSClientSettings(BaseSettings):
+    enabled: bool = False
+    region_name: str = "us-east-1"
+    # Point this at fake_aws_server.py to run without AWS
+    endpoint_url: Optional[str] = None
+    max_pool_connections: int = 50
+    keepalive_timeout: float = 30.0
+    connect_timeout: float = 5.0
+    read_timeout: float = 60.0
+    max_attempts: int = 4
+    backoff_base: float = 0.1
+    backoff_cap: float = 5.0
+    # Retries spend from a shared quota so an outage does not multiply load
+    retry_quota: int = 100
+    retry_cost: int = 5
+    throttle_retry_cost: int = 10
+    model_concurrency: int = 8
+    model_concurrency_overrides: Dict[str, int] = {}
+    breaker_failure_threshold: int = 5
+    breaker_reset_timeout: float = 30.0
+
+    class Config:
+        env_prefix = "SRE_AWS_"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because its circuit breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit '{name}' is open, retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.open_count = 0
+        self._probe_in_flight = False
+        self._probe_started_at = 0.0
+
+    def before_call(self) -> bool:
+        """Raise CircuitOpenError if the call may not go ahead; return True if it is the probe."""
+        if self.state == self.CLOSED:
+            return False
+        now = time.monotonic()
+        elapsed = now - self.opened_at
+        if self.state == self.OPEN and elapsed >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            # A probe that never reported back (e.g. a lost task) must not block recovery
+            probe_expired = now - self._probe_started_at >= self.reset_timeout
+            if not self._probe_in_flight or probe_expired:
+                self._probe_in_flight = True
+                self._probe_started_at = now
+                return True
+            raise CircuitOpenError(self.name, self.reset_timeout - (now - self._probe_started_at))
+        raise CircuitOpenError(self.name, max(self.reset_timeout - elapsed, 0.0))
+
+    def release_probe(self):
+        """Give up a probe that ended without an outcome, such as a cancelled call."""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.open_count += 1
+                logger.warning("Circuit '%s' opened after %d failures", self.name, self.failures)
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+
+class RetryQuota:
+    """Token bucket shared by all retries; successful calls refill it."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.available = capacity
+
+    def acquire(self, cost: int) -> bool:
+        if self.available < cost:
+            return False
+        self.available -= cost
+        return True
+
+    def release(self, amount: int):
+        self.available = min(self.capacity, self.available + amount)
+
+
+def is_throttling_error(error: Exception) -> bool:
+    return isinstance(error, ClientError) and error.response.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES
+
+
+def is_retryable_error(error: Exception) -> bool:
+    if isinstance(error, CONNECTION_ERRORS):
+        return True
+    if not isinstance(error, ClientError):
+        return False
+    code = error.response.get("Error", {}).get("Code")
+    status_code = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+    return code in THROTTLING_ERROR_CODES or code in TRANSIENT_ERROR_CODES or status_code >= 500
+
+
+def build_model_body(model_id: str, prompt: str, max_tokens: int = 1024) -> Dict[str, Any]:
+    """Build the InvokeModel request body for the model's provider."""
+    if model_id.startswith("anthropic."):
+        return {
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": max_tokens,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+    if model_id.startswith("amazon.titan"):
+        return {
+            "inputText": prompt,
+            "textGenerationConfig": {"maxTokenCount": max_tokens},
+        }
+    if model_id.startswith("amazon.nova"):
+        return {
+            "messages": [{"role": "user", "content": [{"text": prompt}]}],
+            "inferenceConfig": {"maxTokens": max_tokens},
+        }
+    raise ValueError(f"Unsupported Bedrock model: {model_id}")
+
+
+def extract_model_text(model_id: str, payload: Dict[str, Any]) -> str:
+    """Pull the generated text out of an InvokeModel response body."""
+    if model_id.startswith("anthropic."):
+        return "".join(block.get("text", "") for block in payload.get("content", []))
+    if model_id.startswith("amazon.titan"):
+        return "".join(result.get("outputText", "") for result in payload.get("results", []))
+    if model_id.startswith("amazon.nova"):
+        content = payload.get("output", {}).get("message", {}).get("content", [])
+        return "".join(block.get("text", "") for block in content)
+    raise ValueError(f"Unsupported Bedrock model: {model_id}")
+
+
+class AWSClientManager:
+    """Owns the pooled Bedrock and CloudWatch clients for the process."""
+
+    def __init__(self, settings: AWSClientSettings):
+        self.settings = settings
+        self._session = get_session()
+        self._exit_stack: Optional[AsyncExitStack] = None
+        self._clients: Dict[str, Any] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._retry_quota = RetryQuota(settings.retry_quota)
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "rejected": 0}
+
+    @property
+    def started(self) -> bool:
+        return self._exit_stack is not None
+
+    def _client_config(self) -> AioConfig:
+        return AioConfig(
+            region_name=self.settings.region_name,
+            max_pool_connections=self.settings.max_pool_connections,
+            connect_timeout=self.settings.connect_timeout,
+            read_timeout=self.settings.read_timeout,
+            # Retries are handled in call() so they can share the quota and breaker
+            retries={"total_max_attempts": 1, "mode": "standard"},
+            connector_args={"keepalive_timeout": self.settings.keepalive_timeout},
+        )
+
+    async def start(self):
+        if self.started:
+            return
+        exit_stack = AsyncExitStack()
+        config = self._client_config()
+        for service in ("bedrock-runtime", "cloudwatch"):
+            self._clients[service] = await exit_stack.enter_async_context(
+                self._session.create_client(
+                    service,
+                    region_name=self.settings.region_name,
+                    endpoint_url=self.settings.endpoint_url,
+                    config=config,
+                )
+            )
+        self._exit_stack = exit_stack
+        logger.info("AWS clients started (endpoint=%s)", self.settings.endpoint_url or "default")
+
+    async def close(self):
+        if not self.started:
+            return
+        await self._exit_stack.aclose()
+        self._exit_stack = None
+        self._clients.clear()
+
+    def client(self, service: str):
+        if service not in self._clients:
+            raise RuntimeError(f"AWS client '{service}' is not started")
+        return self._clients[service]
+
+    def semaphore(self, key: str) -> asyncio.Semaphore:
+        if key not in self._semaphores:
+            limit = self.settings.model_concurrency_overrides.get(key, self.settings.model_concurrency)
+            self._semaphores[key] = asyncio.Semaphore(limit)
+        return self._semaphores[key]
+
+    def breaker(self, key: str) -> CircuitBreaker:
+        if key not in self._breakers:
+            self._breakers[key] = CircuitBreaker(
+                key,
+                self.settings.breaker_failure_threshold,
+                self.settings.breaker_reset_timeout,
+            )
+        return self._breakers[key]
+
+    def _backoff_delay(self, attempt: int, throttled: bool) -> float:
+        # Full jitter; throttles back off from a higher base to shed load faster
+        base = self.settings.backoff_base * (4 if throttled else 1)
+        return random.uniform(0, min(self.settings.backoff_cap, base * 2 ** attempt))
+
+    async def call(self, service: str, operation: str, key: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        """Call a client operation with concurrency limits, retries and a circuit breaker.
+
+        ``key`` selects the semaphore and breaker; it defaults to the service name.
+        """
+        key = key or service
+        breaker = self.breaker(key)
+        method = getattr(self.client(service), operation)
+        attempt = 0
+        self.stats["calls"] += 1
+
+        while True:
+            try:
+                is_probe = breaker.before_call()
+            except CircuitOpenError:
+                self.stats["rejected"] += 1
+                raise
+            try:
+                async with self.semaphore(key):
+                    response = await method(**kwargs)
+            except Exception as e:
+                throttled = is_throttling_error(e)
+                retryable = is_retryable_error(e)
+                if retryable:
+                    breaker.record_failure()
+                else:
+                    # The service answered, so the endpoint itself is healthy
+                    breaker.record_success()
+                attempt += 1
+                cost = self.settings.throttle_retry_cost if throttled else self.settings.retry_cost
+                if (
+                    not retryable
+                    or attempt >= self.settings.max_attempts
+                    or breaker.state == CircuitBreaker.OPEN
+                    or not self._retry_quota.acquire(cost)
+                ):
+                    self.stats["failures"] += 1
+                    raise
+                self.stats["retries"] += 1
+                await asyncio.sleep(self._backoff_delay(attempt, throttled))
+                continue
+            except BaseException:
+                # Cancellation says nothing about the service; let the next call probe
+                if is_probe:
+                    breaker.release_probe()
+                raise
+
+            breaker.record_success()
+            self._retry_quota.release(1 if attempt == 0 else self.settings.retry_cost)
+            return response
+
+    async def invoke_model(self, model_id: str, prompt: str, max_tokens: int = 1024) -> str:
+        response = await self.call(
+            "bedrock-runtime",
+            "invoke_model",
+            key=model_id,
+            modelId=model_id,
+            contentType="application/json",
+            accept="application/json",
+            body=json.dumps(build_model_body(model_id, prompt, max_tokens)),
+        )
+        async with response["body"] as stream:
+            payload = json.loads(await stream.read())
+        return extract_model_text(model_id, payload)
+
+    async def get_metric_statistics(self, **kwargs) -> Dict[str, Any]:
+        return await self.call("cloudwatch", "get_metric_statistics", **kwargs)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters and breaker states for health checks and benchmarks."""
+        return {
+            **self.stats,
+            "retry_quota": self._retry_quota.available,
+            "breakers": {
+                key: {"state": breaker.state, "open_count": breaker.open_count}
+                for key, breaker in self._breakers.items()
+            },
+        }
@@ -0,0 +1,103 @@
+"""Throughput and failure benchmark for the AWS client layer.
+
+Starts fake_aws_server in-process and drives AWSClientManager against it:
+
+    python benchmark_aws.py --requests 2000 --concurrency 100 --throttle-rate 0.05
+    python benchmark_aws.py --outage-after 500   # switch on 100% errors mid-run
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from aiohttp import web
+
+from aws_clients import LOG_ANALYSIS_MODEL, AWSClientManager, AWSClientSettings, CircuitOpenError
+from fake_aws_server import create_app
+
+
+async def run_benchmark(args):
+    # The fake server does not check signatures, but botocore needs credentials to sign
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "fake")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "fake")
+
+    app = create_app(
+        latency_ms=args.latency_ms,
+        throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate,
+        max_concurrency=args.server_max_concurrency,
+    )
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", args.port)
+    await site.start()
+
+    settings = AWSClientSettings(
+        enabled=True,
+        endpoint_url=f"http://127.0.0.1:{args.port}",
+        model_concurrency=args.model_concurrency,
+        breaker_reset_timeout=args.breaker_reset_timeout,
+    )
+    manager = AWSClientManager(settings)
+    await manager.start()
+
+    latencies = []
+    outcomes = {"ok": 0, "failed": 0, "rejected": 0}
+    queue = asyncio.Queue()
+    for i in range(args.requests):
+        queue.put_nowait(i)
+
+    async def worker():
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            if args.outage_after and i == args.outage_after:
+                app["state"].config["error_rate"] = 1.0
+            started = time.perf_counter()
+            try:
+                await manager.invoke_model(LOG_ANALYSIS_MODEL, "benchmark prompt " * 20, max_tokens=256)
+                outcomes["ok"] += 1
+                latencies.append(time.perf_counter() - started)
+            except CircuitOpenError:
+                outcomes["rejected"] += 1
+            except Exception:
+                outcomes["failed"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    await manager.close()
+    await runner.cleanup()
+
+    print(f"requests:      {args.requests} in {elapsed:.2f}s ({args.requests / elapsed:.0f} req/s)")
+    print(f"outcomes:      {outcomes}")
+    if latencies:
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"latency p50:   {statistics.median(latencies) * 1000:.1f}ms")
+        print(f"latency p99:   {p99 * 1000:.1f}ms")
+    print(f"client stats:  {manager.snapshot()}")
+    print(f"server stats:  {app['state'].stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the AWS client layer against the fake server")
+    parser.add_argument("--port", type=int, default=4577)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--model-concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--server-max-concurrency", type=int, default=0)
+    parser.add_argument("--breaker-reset-timeout", type=float, default=5.0)
+    parser.add_argument("--outage-after", type=int, default=0, help="Fail every request after this many")
+    asyncio.run(run_benchmark(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""Token-budgeted prompt context assembly for the Bedrock analysis agents.
+
+Raw log, metric and dashboard inputs can be arbitrarily large. The builder
+ranks their lines by relevance (severity, closeness to the anomaly window and
+novelty), packs the best ones into a per-model token budget and reports what
+was left out.
+"""
+import json
+import math
+import re
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, BaseSettings
+
+# Rough characters-per-token ratio for English text and log output
+CHARS_PER_TOKEN = 4
+
+SEVERITY_PATTERNS = [
+    (re.compile(r"\b(FATAL|CRITICAL|PANIC|EMERG(ENCY)?)\b", re.IGNORECASE), 1.0),
+    (re.compile(r"\b(ERROR|ERR|SEVERE)\b|Exception|Traceback|\bfailed\b|\btimed? ?out\b", re.IGNORECASE), 0.8),
+    (re.compile(r"\b(WARN|WARNING)\b", re.IGNORECASE), 0.5),
+    (re.compile(r"\b(DEBUG|TRACE)\b", re.IGNORECASE), 0.05),
+]
+DEFAULT_SEVERITY = 0.2
+
+TIMESTAMP_PATTERN = re.compile(
+    r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?"
+)
+# Variable parts of a line that should not make two lines look different.
+# Short numbers (status codes, counts) and quoted names are kept, since they
+# usually carry the facts that distinguish one line from another.
+TEMPLATE_PATTERNS = [
+    re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", re.IGNORECASE),
+    re.compile(r"0x[0-9a-f]+", re.IGNORECASE),
+    re.compile(r"\d+\.\d+|\d{4,}"),
+]
+
+SEVERITY_WEIGHT = 0.5
+PROXIMITY_WEIGHT = 0.3
+NOVELTY_WEIGHT = 0.2
+
+
+class ContextSettings(BaseSettings):
+    default_budget: int = 8000
+    # Per-model overrides, e.g. SRE_CONTEXT_MODEL_BUDGETS='{"amazon.nova-pro-v1:0": 16000}'
+    model_budgets: Dict[str, int] = {}
+    # Share of the budget the incident description may take before it is truncated
+    description_share: float = 0.2
+    max_line_chars: int = 2000
+
+    class Config:
+        env_prefix = "SRE_CONTEXT_"
+
+
+class SectionReport(BaseModel):
+    kept_lines: int = 0
+    dropped_lines: int = 0
+    collapsed_lines: int = 0
+    kept_tokens: int = 0
+    dropped_tokens: int = 0
+    dropped_by_severity: Dict[str, int] = {}
+
+
+class ContextReport(BaseModel):
+    model_id: str
+    budget_tokens: int
+    used_tokens: int
+    anomaly_window: Optional[Tuple[datetime, datetime]] = None
+    sections: Dict[str, SectionReport] = {}
+
+
+class BuiltContext(BaseModel):
+    description: str
+    sections: Dict[str, str]
+    report: ContextReport
+
+    def render(self, instructions: str) -> str:
+        parts = [f"Incident: {self.description}", instructions]
+        for name, text in self.sections.items():
+            if text:
+                parts.append(f"--- {name} ---\n{text}")
+        return "\n\n".join(parts)
+
+
+class _Candidate:
+    __slots__ = ("section", "index", "text", "template", "tokens", "severity", "proximity", "similar", "score")
+
+    def __init__(
+        self,
+        section: str,
+        index: int,
+        text: str,
+        template: str,
+        severity: float,
+        proximity: float,
+        similar: int,
+    ):
+        self.section = section
+        self.index = index
+        self.text = text
+        self.template = template
+        self.tokens = estimate_tokens(text)
+        self.severity = severity
+        self.proximity = proximity
+        # Lines sharing a template with many others are less novel
+        self.similar = similar
+        self.score = (
+            SEVERITY_WEIGHT * severity
+            + PROXIMITY_WEIGHT * proximity
+            + NOVELTY_WEIGHT / similar
+        )
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def severity_score(line: str) -> float:
+    for pattern, score in SEVERITY_PATTERNS:
+        if pattern.search(line):
+            return score
+    return DEFAULT_SEVERITY
+
+
+def severity_label(score: float) -> str:
+    if score >= 1.0:
+        return "critical"
+    if score >= 0.8:
+        return "error"
+    if score >= 0.5:
+        return "warning"
+    return "info"
+
+
+def line_template(line: str) -> str:
+    line = TIMESTAMP_PATTERN.sub("", line)
+    for pattern in TEMPLATE_PATTERNS:
+        line = pattern.sub("#", line)
+    return line.strip()
+
+
+def parse_timestamp(value: str) -> Optional[datetime]:
+    value = value.replace(",", ".").replace(" ", "T", 1)
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    elif len(value) > 5 and value[-5] in "+-" and value[-3] != ":":
+        value = value[:-2] + ":" + value[-2:]
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def line_timestamp(line: str) -> Optional[datetime]:
+    match = TIMESTAMP_PATTERN.search(line)
+    return parse_timestamp(match.group(0)) if match else None
+
+
+def proximity_score(timestamp: Optional[datetime], window: Optional[Tuple[datetime, datetime]]) -> float:
+    if window is None or timestamp is None:
+        return 0.5
+    start, end = window
+    if start <= timestamp <= end:
+        return 1.0
+    distance = (start - timestamp) if timestamp < start else (timestamp - end)
+    scale = max((end - start).total_seconds(), 300.0)
+    return math.exp(-distance.total_seconds() / scale)
+
+
+def _metric_series(metrics_data: str) -> Optional[List[dict]]:
+    """Return metrics as CloudWatch-style series if the input is JSON, else None."""
+    try:
+        parsed = json.loads(metrics_data)
+    except ValueError:
+        return None
+    series = parsed if isinstance(parsed, list) else [parsed]
+    if not series or not all(isinstance(item, dict) and isinstance(item.get("Datapoints"), list) for item in series):
+        return None
+    return series
+
+
+def _series_points(series: dict) -> List[Tuple[Optional[datetime], float]]:
+    points = []
+    for point in series["Datapoints"]:
+        if not isinstance(point, dict):
+            continue
+        value = point.get("Value", point.get("Average", point.get("Maximum")))
+        if isinstance(value, (int, float)):
+            points.append((parse_timestamp(str(point.get("Timestamp", ""))), float(value)))
+    return points
+
+
+def _peak_deviation(points: List[Tuple[Optional[datetime], float]]) -> Tuple[float, Optional[datetime]]:
+    """Largest z-score in the series and when it happened."""
+    values = [value for _, value in points]
+    mean = sum(values) / len(values)
+    stddev = math.sqrt(sum((value - mean) ** 2 for value in values) / len(values))
+    if stddev == 0:
+        return 0.0, None
+    peak_time, peak_value = max(points, key=lambda point: abs(point[1] - mean))
+    return abs(peak_value - mean) / stddev, peak_time
+
+
+def summarize_metrics(metrics_data: str) -> List[str]:
+    """Collapse CloudWatch-style JSON into one summary line per series.
+
+    Non-JSON input is returned line by line and ranked like log text.
+    """
+    series_list = _metric_series(metrics_data)
+    if series_list is None:
+        return metrics_data.splitlines()
+
+    summaries = []
+    for series in series_list:
+        points = _series_points(series)
+        if not points:
+            continue
+        values = [value for _, value in points]
+        zscore, peak_time = _peak_deviation(points)
+        dimensions = ",".join(f"{d.get('Name')}={d.get('Value')}" for d in series.get("Dimensions", []))
+        summary = (
+            f"{series.get('Namespace', '')} {series.get('MetricName', 'metric')}"
+            f"{f' [{dimensions}]' if dimensions else ''}: n={len(values)} "
+            f"min={min(values):.2f} mean={sum(values) / len(values):.2f} max={max(values):.2f} "
+            f"last={values[-1]:.2f} peak_z={zscore:.1f}"
+        )
+        if peak_time is not None:
+            summary += f" peak_at={peak_time.isoformat()}"
+        # Large deviations read as errors so they rank with error log lines
+        if zscore >= 3:
+            summary = "ERROR anomaly " + summary
+        elif zscore >= 2:
+            summary = "WARN anomaly " + summary
+        summaries.append(summary)
+    # Nothing numeric to summarise; keep the raw text rather than drop the section
+    return summaries or metrics_data.splitlines()
+
+
+def detect_anomaly_window(
+    log_data: Optional[str] = None,
+    metrics_data: Optional[str] = None,
+    padding: timedelta = timedelta(minutes=5),
+) -> Optional[Tuple[datetime, datetime]]:
+    """Best guess at when the incident happened.
+
+    Uses the peaks of strongly deviating metric series when there are any,
+    otherwise the span of error-level log lines.
+    """
+    peaks = []
+    series_list = _metric_series(metrics_data) if metrics_data else None
+    for series in series_list or []:
+        points = _series_points(series)
+        if points:
+            zscore, peak_time = _peak_deviation(points)
+            if zscore >= 2 and peak_time is not None:
+                peaks.append(peak_time)
+
+    if not peaks and log_data:
+        for line in log_data.splitlines():
+            if severity_score(line) >= 0.8:
+                timestamp = line_timestamp(line)
+                if timestamp is not None:
+                    peaks.append(timestamp)
+
+    if not peaks:
+        return None
+    return min(peaks) - padding, max(peaks) + padding
+
+
+class ContextBuilder:
+    def __init__(self, settings: ContextSettings):
+        self.settings = settings
+
+    def budget_for(self, model_id: str) -> int:
+        return self.settings.model_budgets.get(model_id, self.settings.default_budget)
+
+    def _candidates(
+        self,
+        section: str,
+        lines: List[str],
+        window: Optional[Tuple[datetime, datetime]],
+    ) -> List[_Candidate]:
+        max_chars = self.settings.max_line_chars
+        lines = [line[:max_chars] for line in lines if line.strip()]
+        templates = [line_template(line) for line in lines]
+        template_counts = Counter(templates)
+
+        candidates = []
+        last_timestamp = None
+        for index, (line, template) in enumerate(zip(lines, templates)):
+            # Continuation lines (stack traces) inherit the previous timestamp
+            last_timestamp = line_timestamp(line) or last_timestamp
+            candidates.append(_Candidate(
+                section, index, line, template, severity_score(line),
+                proximity_score(last_timestamp, window), template_counts[template],
+            ))
+        return candidates
+
+    def _collapse(self, candidates: List[_Candidate], report: SectionReport) -> List[_Candidate]:
+        """Replace each group of same-template lines with its most important member."""
+        groups: Dict[str, List[_Candidate]] = {}
+        for candidate in candidates:
+            groups.setdefault(candidate.template, []).append(candidate)
+
+        collapsed = []
+        for members in groups.values():
+            best = max(members, key=lambda c: (c.severity, c.proximity, -c.index))
+            if len(members) > 1:
+                report.collapsed_lines += len(members) - 1
+                best = _Candidate(
+                    best.section, best.index, f"{best.text} [x{len(members)} similar]", best.template,
+                    best.severity, best.proximity, best.similar,
+                )
+            collapsed.append(best)
+        return collapsed
+
+    def build(
+        self,
+        model_id: str,
+        description: str,
+        sections: Dict[str, Optional[str]],
+        anomaly_window: Optional[Tuple[datetime, datetime]] = None,
+    ) -> BuiltContext:
+        """Pack the most relevant lines of each section into the model's budget.
+
+        Sections named "metrics" are summarised per series before ranking.
+        Kept lines are emitted in their original order.
+        """
+        budget = self.budget_for(model_id)
+        report = ContextReport(model_id=model_id, budget_tokens=budget, used_tokens=0, anomaly_window=anomaly_window)
+
+        max_description_chars = int(budget * self.settings.description_share) * CHARS_PER_TOKEN
+        if len(description) > max_description_chars:
+            description = description[:max_description_chars] + " ..."
+        remaining = budget - estimate_tokens(description)
+
+        by_section: Dict[str, List[_Candidate]] = {}
+        for name, text in sections.items():
+            report.sections[name] = SectionReport()
+            if text:
+                lines = summarize_metrics(text) if name == "metrics" else text.splitlines()
+                by_section[name] = self._candidates(name, lines, anomaly_window)
+
+        # Repeated lines are only merged when the raw text does not fit,
+        # starting with the largest section
+        tokens = {name: sum(c.tokens for c in items) for name, items in by_section.items()}
+        for name in sorted(tokens, key=tokens.get, reverse=True):
+            if sum(tokens.values()) <= remaining:
+                break
+            by_section[name] = self._collapse(by_section[name], report.sections[name])
+            tokens[name] = sum(c.tokens for c in by_section[name])
+
+        candidates = [candidate for items in by_section.values() for candidate in items]
+        kept: Dict[str, List[_Candidate]] = {name: [] for name in sections}
+        for candidate in sorted(candidates, key=lambda c: c.score, reverse=True):
+            section_report = report.sections[candidate.section]
+            if candidate.tokens <= remaining:
+                remaining -= candidate.tokens
+                kept[candidate.section].append(candidate)
+                section_report.kept_lines += 1
+                section_report.kept_tokens += candidate.tokens
+            else:
+                label = severity_label(candidate.severity)
+                section_report.dropped_lines += 1
+                section_report.dropped_tokens += candidate.tokens
+                section_report.dropped_by_severity[label] = section_report.dropped_by_severity.get(label, 0) + 1
+
+        report.used_tokens = budget - remaining
+        return BuiltContext(
+            description=description,
+            sections={
+                name: "\n".join(c.text for c in sorted(items, key=lambda c: c.index))
+                for name, items in kept.items()
+            },
+            report=report,
+        )
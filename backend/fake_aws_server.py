@@ -0,0 +1,220 @@
+"""Local stand-in for the Bedrock runtime and CloudWatch APIs.
+
+Serves InvokeModel and GetMetricStatistics well enough for the real
+aiobotocore clients, with configurable latency and failure injection, so the
+client layer can be exercised and benchmarked offline:
+
+    python fake_aws_server.py --port 4566 --latency-ms 50 --throttle-rate 0.05
+    SRE_AWS_ENABLED=true SRE_AWS_ENDPOINT_URL=http://localhost:4566 uvicorn main:app
+
+Failure settings can be changed while running with POST /_fake/config.
+"""
+import argparse
+import asyncio
+import math
+import random
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict
+from urllib.parse import parse_qs
+from xml.sax.saxutils import escape
+
+from aiohttp import web
+
+CLOUDWATCH_XMLNS = "http://monitoring.amazonaws.com/doc/2010-08-01/"
+
+DEFAULT_CONFIG = {
+    "latency_ms": 20.0,
+    "jitter_ms": 10.0,
+    # Fraction of requests answered with a throttling error
+    "throttle_rate": 0.0,
+    # Fraction of requests answered with a 5xx error
+    "error_rate": 0.0,
+    # Requests in flight above this are throttled, like a real account quota
+    "max_concurrency": 0,
+}
+
+
+class FakeAWSState:
+    def __init__(self, **config):
+        self.config = {**DEFAULT_CONFIG, **config}
+        self.in_flight = 0
+        self.stats = {"requests": 0, "throttled": 0, "errors": 0}
+
+    def pick_failure(self) -> str:
+        """Return "throttle", "error" or "" for the request about to be served."""
+        max_concurrency = self.config["max_concurrency"]
+        if max_concurrency and self.in_flight > max_concurrency:
+            return "throttle"
+        roll = random.random()
+        if roll < self.config["throttle_rate"]:
+            return "throttle"
+        if roll < self.config["throttle_rate"] + self.config["error_rate"]:
+            return "error"
+        return ""
+
+    async def simulate_latency(self):
+        delay = self.config["latency_ms"] + random.uniform(0, self.config["jitter_ms"])
+        await asyncio.sleep(delay / 1000)
+
+
+def fake_model_payload(model_id: str, prompt: str) -> Dict[str, Any]:
+    text = f"Fake analysis from {model_id} for a {len(prompt)}-character prompt."
+    if model_id.startswith("anthropic."):
+        return {
+            "id": f"msg_{uuid.uuid4().hex}",
+            "type": "message",
+            "role": "assistant",
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+        }
+    if model_id.startswith("amazon.titan"):
+        return {"results": [{"outputText": text, "completionReason": "FINISH"}]}
+    return {"output": {"message": {"role": "assistant", "content": [{"text": text}]}}, "stopReason": "end_turn"}
+
+
+def extract_prompt(body: Dict[str, Any]) -> str:
+    if "inputText" in body:
+        return body["inputText"]
+    parts = []
+    for message in body.get("messages", []):
+        content = message.get("content", "")
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(block.get("text", "") for block in content)
+    return "".join(parts)
+
+
+def parse_timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def cloudwatch_error(code: str, message: str, status: int) -> web.Response:
+    body = (
+        f'<ErrorResponse xmlns="{CLOUDWATCH_XMLNS}">'
+        f"<Error><Type>{'Sender' if status < 500 else 'Receiver'}</Type>"
+        f"<Code>{code}</Code><Message>{escape(message)}</Message></Error>"
+        f"<RequestId>{uuid.uuid4()}</RequestId></ErrorResponse>"
+    )
+    return web.Response(status=status, text=body, content_type="text/xml")
+
+
+def bedrock_error(code: str, message: str, status: int) -> web.Response:
+    return web.json_response({"message": message}, status=status, headers={"x-amzn-ErrorType": code})
+
+
+async def invoke_model(request: web.Request) -> web.Response:
+    state: FakeAWSState = request.app["state"]
+    state.stats["requests"] += 1
+    state.in_flight += 1
+    try:
+        failure = state.pick_failure()
+        await state.simulate_latency()
+        if failure == "throttle":
+            state.stats["throttled"] += 1
+            return bedrock_error("ThrottlingException", "Too many requests, please wait before trying again.", 429)
+        if failure == "error":
+            state.stats["errors"] += 1
+            return bedrock_error("InternalServerException", "Internal server error", 500)
+        model_id = request.match_info["model_id"]
+        body = await request.json()
+        return web.json_response(fake_model_payload(model_id, extract_prompt(body)))
+    finally:
+        state.in_flight -= 1
+
+
+async def cloudwatch_query(request: web.Request) -> web.Response:
+    state: FakeAWSState = request.app["state"]
+    state.stats["requests"] += 1
+    state.in_flight += 1
+    try:
+        params = {key: values[0] for key, values in parse_qs(await request.text()).items()}
+        if params.get("Action") != "GetMetricStatistics":
+            return cloudwatch_error("InvalidAction", f"Unsupported action: {params.get('Action')}", 400)
+        failure = state.pick_failure()
+        await state.simulate_latency()
+        if failure == "throttle":
+            state.stats["throttled"] += 1
+            return cloudwatch_error("Throttling", "Rate exceeded", 400)
+        if failure == "error":
+            state.stats["errors"] += 1
+            return cloudwatch_error("InternalFailure", "Internal failure", 500)
+
+        start = parse_timestamp(params["StartTime"]).timestamp()
+        end = parse_timestamp(params["EndTime"]).timestamp()
+        period = int(params.get("Period", 60))
+        statistic = params.get("Statistics.member.1", "Average")
+        unit = "Count" if params.get("MetricName") == "DatabaseConnections" else "Percent"
+
+        members = []
+        current = start
+        while current <= end:
+            value = 50 + 20 * math.sin(current / 600) + random.random() * 10
+            timestamp = datetime.fromtimestamp(current, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            members.append(
+                f"<member><Timestamp>{timestamp}</Timestamp>"
+                f"<{statistic}>{value:.4f}</{statistic}><Unit>{unit}</Unit></member>"
+            )
+            current += period
+
+        body = (
+            f'<GetMetricStatisticsResponse xmlns="{CLOUDWATCH_XMLNS}">'
+            f"<GetMetricStatisticsResult><Label>{escape(params.get('MetricName', ''))}</Label>"
+            f"<Datapoints>{''.join(members)}</Datapoints></GetMetricStatisticsResult>"
+            f"<ResponseMetadata><RequestId>{uuid.uuid4()}</RequestId></ResponseMetadata>"
+            f"</GetMetricStatisticsResponse>"
+        )
+        return web.Response(text=body, content_type="text/xml")
+    finally:
+        state.in_flight -= 1
+
+
+async def get_config(request: web.Request) -> web.Response:
+    state: FakeAWSState = request.app["state"]
+    return web.json_response({"config": state.config, "stats": state.stats})
+
+
+async def update_config(request: web.Request) -> web.Response:
+    state: FakeAWSState = request.app["state"]
+    updates = await request.json()
+    unknown = set(updates) - set(DEFAULT_CONFIG)
+    if unknown:
+        return web.json_response({"error": f"Unknown settings: {sorted(unknown)}"}, status=400)
+    state.config.update(updates)
+    return web.json_response({"config": state.config, "stats": state.stats})
+
+
+def create_app(**config) -> web.Application:
+    app = web.Application()
+    app["state"] = FakeAWSState(**config)
+    app.router.add_post("/model/{model_id}/invoke", invoke_model)
+    app.router.add_post("/", cloudwatch_query)
+    app.router.add_get("/_fake/config", get_config)
+    app.router.add_post("/_fake/config", update_config)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Bedrock/CloudWatch endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4566)
+    parser.add_argument("--latency-ms", type=float, default=DEFAULT_CONFIG["latency_ms"])
+    parser.add_argument("--jitter-ms", type=float, default=DEFAULT_CONFIG["jitter_ms"])
+    parser.add_argument("--throttle-rate", type=float, default=DEFAULT_CONFIG["throttle_rate"])
+    parser.add_argument("--error-rate", type=float, default=DEFAULT_CONFIG["error_rate"])
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_CONFIG["max_concurrency"])
+    args = parser.parse_args()
+
+    app = create_app(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate,
+        max_concurrency=args.max_concurrency,
+    )
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,544 @@
+"""Snapshot-backed knowledge base store.
+
+A snapshot is a directory holding the knowledge base records and the indexes
+derived from them:
+
+    manifest.json         format version, entry count, vector size
+    records.bin           entry JSON, back to back
+    record_offsets.npy    uint64 start of each record (count + 1 values)
+    search_text.bin       lower-cased search fields of each record, NUL-separated
+    search_offsets.npy    uint64 start of each record's search text (count + 1 values)
+    ids.npy               entry ids in record order
+    sorted_ids.npy        entry ids sorted, for binary search
+    sorted_rows.npy       record row of each sorted id
+    trigram_keys.npy      sorted crc32 of each lower-cased trigram
+    trigram_offsets.npy   start of each key's postings (keys + 1 values)
+    trigram_postings.npy  record rows containing each trigram
+    vectors.npy           hashed bag-of-words vectors, one row per record
+
+Arrays are memory-mapped and records are decoded on access, so opening a
+snapshot costs the same whatever the corpus size. Writes go to an in-memory
+overlay that is folded into the next snapshot.
+"""
+import fcntl
+import json
+import logging
+import mmap
+import os
+import re
+import shutil
+import zlib
+from collections import defaultdict
+from collections.abc import MutableMapping
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Type
+
+import numpy as np
+from pydantic import BaseModel, BaseSettings
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 2
+# Version 1 generations lack the search text column and are searched from the records
+READABLE_FORMAT_VERSIONS = (1, 2)
+VECTOR_DIM = 256
+CURRENT_FILE = "CURRENT"
+WRITER_LOCK_FILE = "writer.lock"
+
+# Fields matched by the knowledge base text search
+SEARCH_FIELDS = ("title", "description", "root_cause")
+# Fields that make up the similarity vector
+SIMILARITY_FIELDS = ("title", "description", "root_cause", "resolution", "services", "tags")
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class KnowledgeSnapshotSettings(BaseSettings):
+    # Snapshots are disabled unless a directory is configured
+    snapshot_dir: Optional[str] = None
+    snapshot_interval: float = 300.0
+    keep_generations: int = 2
+    # Instances sharing a snapshot directory must have a single writer; the
+    # others only load. A lock file in the directory enforces this as well.
+    snapshot_writer: bool = True
+
+    class Config:
+        env_prefix = "SRE_KB_"
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def trigram_key(trigram: str) -> int:
+    return zlib.crc32(trigram.encode())
+
+
+def similarity_vector(record: Dict[str, Any]) -> np.ndarray:
+    """Feature-hashed, L2-normalised bag of words for an entry."""
+    buckets = []
+    signs = []
+    for field in SIMILARITY_FIELDS:
+        value = record.get(field) or ""
+        text = " ".join(value) if isinstance(value, list) else value
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            digest = zlib.crc32(token.encode())
+            buckets.append(digest % VECTOR_DIM)
+            # The sign bit keeps hash collisions from only ever adding up
+            signs.append(1.0 if digest & 0x80000000 else -1.0)
+    vector = np.bincount(buckets, weights=signs, minlength=VECTOR_DIM).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def record_search_text(record: Dict[str, Any]) -> bytes:
+    return "\0".join((record.get(field) or "").lower() for field in SEARCH_FIELDS).encode()
+
+
+def matches_query(entry: BaseModel, query: str) -> bool:
+    query = query.lower()
+    return any(query in getattr(entry, field).lower() for field in SEARCH_FIELDS)
+
+
+def _load_array(path: str) -> np.ndarray:
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        # Zero-length arrays cannot be memory-mapped
+        return np.load(path)
+
+
+class KnowledgeSnapshot:
+    """Read-only view of one snapshot generation."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        if self.manifest["version"] not in READABLE_FORMAT_VERSIONS:
+            raise ValueError(f"Unsupported knowledge snapshot version: {self.manifest['version']}")
+        self.count = self.manifest["count"]
+
+        arrays = {}
+        for name in (
+            "record_offsets", "ids", "sorted_ids", "sorted_rows",
+            "trigram_keys", "trigram_offsets", "trigram_postings", "vectors",
+        ):
+            arrays[name] = _load_array(os.path.join(path, f"{name}.npy"))
+        self.record_offsets = arrays["record_offsets"]
+        self.ids = arrays["ids"]
+        self.sorted_ids = arrays["sorted_ids"]
+        self.sorted_rows = arrays["sorted_rows"]
+        self.trigram_keys = arrays["trigram_keys"]
+        self.trigram_offsets = arrays["trigram_offsets"]
+        self.trigram_postings = arrays["trigram_postings"]
+        self.vectors = arrays["vectors"]
+
+        self._records = _map_file(os.path.join(path, "records.bin"))
+        self.search_offsets = None
+        self._search_text = None
+        if self.manifest["version"] >= 2:
+            self.search_offsets = _load_array(os.path.join(path, "search_offsets.npy"))
+            self._search_text = _map_file(os.path.join(path, "search_text.bin"))
+
+    def row_of(self, entry_id: str) -> Optional[int]:
+        key = entry_id.encode()
+        position = int(np.searchsorted(self.sorted_ids, key))
+        if position < self.count and self.sorted_ids[position] == key:
+            return int(self.sorted_rows[position])
+        return None
+
+    def id_at(self, row: int) -> str:
+        return self.ids[row].decode()
+
+    def raw_record(self, row: int) -> bytes:
+        return self._records[int(self.record_offsets[row]):int(self.record_offsets[row + 1])]
+
+    def search_text(self, row: int) -> bytes:
+        if self._search_text is None:
+            return record_search_text(json.loads(self.raw_record(row)))
+        return self._search_text[int(self.search_offsets[row]):int(self.search_offsets[row + 1])]
+
+    def _text_matches(self, row: int, needle: bytes) -> bool:
+        # Checked per field so a match never spans two of them
+        return any(needle in field for field in self.search_text(row).split(b"\0"))
+
+    def _scan(self, needle: bytes) -> Iterator[int]:
+        """Rows containing ``needle``, found by scanning the whole search text column."""
+        text = self._search_text
+        position = text.find(needle)
+        while position != -1:
+            row = int(np.searchsorted(self.search_offsets, np.uint64(position), side="right")) - 1
+            if self._text_matches(row, needle):
+                yield row
+            # One hit is enough; carry on from the next record
+            position = text.find(needle, int(self.search_offsets[row + 1]))
+
+    def matching_rows(self, query: str) -> Iterator[int]:
+        """Rows whose search fields contain ``query``, case-insensitively, in row order.
+
+        Checks the lower-cased text column only, so no record is decoded.
+        """
+        needle = query.lower().encode()
+        rows = self.candidate_rows(query)
+        if rows is None and needle and self._search_text is not None:
+            # Too short for trigrams
+            yield from self._scan(needle)
+            return
+        rows = range(self.count) if rows is None else sorted(int(row) for row in rows)
+        for row in rows:
+            if self._text_matches(row, needle):
+                yield row
+
+    def candidate_rows(self, query: str) -> Optional[np.ndarray]:
+        """Rows that contain every trigram of the query, or None to scan everything."""
+        keys = {trigram_key(trigram) for trigram in trigrams(query.lower())}
+        if not keys:
+            return None
+        rows = None
+        for key in keys:
+            position = int(np.searchsorted(self.trigram_keys, np.uint32(key)))
+            if position >= len(self.trigram_keys) or self.trigram_keys[position] != key:
+                return np.empty(0, dtype=np.uint32)
+            start, end = self.trigram_offsets[position], self.trigram_offsets[position + 1]
+            postings = self.trigram_postings[start:end]
+            rows = postings if rows is None else np.intersect1d(rows, postings, assume_unique=True)
+            if not len(rows):
+                break
+        return rows
+
+
+def _map_file(path: str):
+    with open(path, "rb") as f:
+        # Empty files cannot be memory-mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _write_array(path: str, name: str, array: np.ndarray):
+    np.save(os.path.join(path, f"{name}.npy"), array)
+
+
+def write_snapshot(path: str, count: int, records: Iterable[Tuple[str, bytes]]):
+    """Write one snapshot generation from ``count`` (entry id, entry JSON) pairs."""
+    os.makedirs(path)
+    ids = []
+    offsets = np.zeros(count + 1, dtype=np.uint64)
+    search_offsets = np.zeros(count + 1, dtype=np.uint64)
+    # Keyed by trigram text while building; hashed once per distinct trigram at the end
+    postings: Dict[str, List[int]] = defaultdict(list)
+    vectors_path = os.path.join(path, "vectors.npy")
+    if count:
+        # Written through a memory map so large corpora never sit in memory at once
+        vectors = np.lib.format.open_memmap(
+            vectors_path, mode="w+", dtype=np.float32, shape=(count, VECTOR_DIM)
+        )
+    else:
+        vectors = np.zeros((0, VECTOR_DIM), dtype=np.float32)
+
+    with open(os.path.join(path, "records.bin"), "wb") as f, \
+            open(os.path.join(path, "search_text.bin"), "wb") as search_file:
+        for row, (entry_id, raw) in enumerate(records):
+            ids.append(entry_id.encode())
+            f.write(raw)
+            offsets[row + 1] = offsets[row] + len(raw)
+            record = json.loads(raw)
+            text = record_search_text(record)
+            search_file.write(text)
+            search_offsets[row + 1] = search_offsets[row] + len(text)
+            record_trigrams = set()
+            for field in SEARCH_FIELDS:
+                record_trigrams |= trigrams((record.get(field) or "").lower())
+            for trigram in record_trigrams:
+                postings[trigram].append(row)
+            vectors[row] = similarity_vector(record)
+
+    if len(ids) != count:
+        raise ValueError(f"Expected {count} knowledge records, got {len(ids)}")
+    ids = np.array(ids, dtype=bytes)
+    order = np.argsort(ids, kind="stable")
+    hashed: Dict[int, List[int]] = {}
+    for trigram, rows in postings.items():
+        key = trigram_key(trigram)
+        # Colliding trigrams share a posting list; search re-checks every match
+        hashed[key] = sorted(set(hashed[key]) | set(rows)) if key in hashed else rows
+    keys = np.array(sorted(hashed), dtype=np.uint32)
+    key_offsets = np.zeros(len(keys) + 1, dtype=np.uint64)
+    key_offsets[1:] = np.cumsum([len(hashed[key]) for key in keys.tolist()])
+    flat_postings = np.array(
+        [row for key in keys.tolist() for row in hashed[key]],
+        dtype=np.uint32,
+    )
+
+    _write_array(path, "record_offsets", offsets)
+    _write_array(path, "search_offsets", search_offsets)
+    _write_array(path, "ids", ids)
+    _write_array(path, "sorted_ids", ids[order])
+    _write_array(path, "sorted_rows", order.astype(np.uint32))
+    _write_array(path, "trigram_keys", keys)
+    _write_array(path, "trigram_offsets", key_offsets)
+    _write_array(path, "trigram_postings", flat_postings)
+    if count:
+        vectors.flush()
+        del vectors
+    else:
+        np.save(vectors_path, vectors)
+
+    # The manifest goes last so a partly written generation never loads
+    with open(os.path.join(path, "manifest.json"), "w") as f:
+        json.dump({
+            "version": SNAPSHOT_FORMAT_VERSION,
+            "count": count,
+            "vector_dim": VECTOR_DIM,
+            "created_at": datetime.utcnow().isoformat(),
+        }, f)
+
+
+class KnowledgeStore(MutableMapping):
+    """Dict-like knowledge base backed by the latest snapshot plus recent writes."""
+
+    def __init__(self, model: Type[BaseModel]):
+        self.model = model
+        self.snapshot: Optional[KnowledgeSnapshot] = None
+        self._overlay: Dict[str, BaseModel] = {}
+        self._deleted: Set[str] = set()
+        # Sequence number of the last write to each id, to tell writes apart across freeze()
+        self._sequence = 0
+        self._written_at: Dict[str, int] = {}
+        self.dirty = False
+
+    def _in_snapshot(self, entry_id: str) -> bool:
+        return self.snapshot is not None and self.snapshot.row_of(entry_id) is not None
+
+    def _decode(self, row: int) -> BaseModel:
+        return self.model.parse_raw(self.snapshot.raw_record(row))
+
+    def __getitem__(self, entry_id: str) -> BaseModel:
+        if entry_id in self._overlay:
+            return self._overlay[entry_id]
+        if entry_id not in self._deleted and self.snapshot is not None:
+            row = self.snapshot.row_of(entry_id)
+            if row is not None:
+                return self._decode(row)
+        raise KeyError(entry_id)
+
+    def _record_write(self, entry_id: str):
+        self._sequence += 1
+        self._written_at[entry_id] = self._sequence
+        self.dirty = True
+
+    def __setitem__(self, entry_id: str, entry: BaseModel):
+        self._overlay[entry_id] = entry
+        self._deleted.discard(entry_id)
+        self._record_write(entry_id)
+
+    def __delitem__(self, entry_id: str):
+        if entry_id not in self:
+            raise KeyError(entry_id)
+        self._overlay.pop(entry_id, None)
+        # Recorded even when the id is not in the snapshot yet, since a
+        # snapshot being written in the background may still contain it
+        self._deleted.add(entry_id)
+        self._record_write(entry_id)
+
+    def __contains__(self, entry_id: object) -> bool:
+        if not isinstance(entry_id, str):
+            return False
+        if entry_id in self._overlay:
+            return True
+        return entry_id not in self._deleted and self._in_snapshot(entry_id)
+
+    def _snapshot_rows(self) -> Iterator[Tuple[int, str]]:
+        if self.snapshot is None:
+            return
+        for row in range(self.snapshot.count):
+            entry_id = self.snapshot.id_at(row)
+            if entry_id not in self._deleted:
+                yield row, entry_id
+
+    def __iter__(self) -> Iterator[str]:
+        # Snapshot order first (with overlay versions in place), then new entries
+        seen = set()
+        for _, entry_id in self._snapshot_rows():
+            seen.add(entry_id)
+            yield entry_id
+        for entry_id in list(self._overlay):
+            if entry_id not in seen:
+                yield entry_id
+
+    def __len__(self) -> int:
+        if self.snapshot is None:
+            return len(self._overlay)
+        shadowed = sum(1 for entry_id in self._deleted | set(self._overlay) if self._in_snapshot(entry_id))
+        return self.snapshot.count - shadowed + len(self._overlay)
+
+    def search(self, query: str) -> List[BaseModel]:
+        """Case-insensitive substring search over title, description and root cause."""
+        # May run in a worker thread, so read each attribute once
+        snapshot, overlay, deleted = self.snapshot, dict(self._overlay), set(self._deleted)
+        results = []
+        if snapshot is not None:
+            # Only matching records are decoded
+            for row in snapshot.matching_rows(query):
+                entry_id = snapshot.id_at(row)
+                if entry_id not in overlay and entry_id not in deleted:
+                    results.append(self.model.parse_raw(snapshot.raw_record(row)))
+        results.extend(entry for entry in overlay.values() if matches_query(entry, query))
+        return results
+
+    def similar(self, entry_id: str, limit: int = 5) -> List[Tuple[BaseModel, float]]:
+        """Entries most similar to the given one, by cosine similarity."""
+        target = similarity_vector(json.loads(self[entry_id].json()))
+        scored: List[Tuple[float, str, Optional[int]]] = []
+        if self.snapshot is not None and self.snapshot.count:
+            scores = self.snapshot.vectors @ target
+            # Take extra rows in case some are shadowed by the overlay
+            extra = len(self._overlay) + len(self._deleted) + 1
+            top = np.argsort(-scores)[:limit + extra]
+            for row in top.tolist():
+                row_id = self.snapshot.id_at(row)
+                if row_id not in self._overlay and row_id not in self._deleted:
+                    scored.append((float(scores[row]), row_id, row))
+        for overlay_id, entry in self._overlay.items():
+            vector = similarity_vector(json.loads(entry.json()))
+            scored.append((float(vector @ target), overlay_id, None))
+
+        results = []
+        for score, other_id, row in sorted(scored, key=lambda item: item[0], reverse=True):
+            if other_id == entry_id:
+                continue
+            entry = self._overlay[other_id] if row is None else self._decode(row)
+            results.append((entry, score))
+            if len(results) == limit:
+                break
+        return results
+
+    def iter_records(self) -> Iterator[Tuple[str, bytes]]:
+        """Contents as (entry id, entry JSON), reusing snapshot bytes where unchanged."""
+        for row, entry_id in self._snapshot_rows():
+            if entry_id in self._overlay:
+                yield entry_id, self._overlay[entry_id].json().encode()
+            else:
+                yield entry_id, self.snapshot.raw_record(row)
+        for entry_id, entry in self._overlay.items():
+            if not self._in_snapshot(entry_id):
+                yield entry_id, entry.json().encode()
+
+    def freeze(self) -> "KnowledgeStore":
+        """Point-in-time copy that a worker thread can write out while this store keeps changing."""
+        frozen = KnowledgeStore(self.model)
+        frozen.snapshot = self.snapshot
+        # Copies, because endpoints update entries in place
+        frozen._overlay = {entry_id: entry.copy() for entry_id, entry in self._overlay.items()}
+        frozen._deleted = set(self._deleted)
+        frozen._sequence = self._sequence
+        self.dirty = False
+        return frozen
+
+    def swap(self, snapshot: KnowledgeSnapshot, frozen: "KnowledgeStore"):
+        """Switch to a snapshot written from ``frozen``, keeping writes made since."""
+        self.snapshot = snapshot
+        self._written_at = {
+            entry_id: sequence for entry_id, sequence in self._written_at.items()
+            if sequence > frozen._sequence
+        }
+        self._overlay = {
+            entry_id: entry for entry_id, entry in self._overlay.items()
+            if entry_id in self._written_at
+        }
+        self._deleted = {entry_id for entry_id in self._deleted if entry_id in self._written_at}
+
+
+class KnowledgeSnapshotManager:
+    """Writes snapshot generations and points CURRENT at the newest one.
+
+    Only one process may write to a directory. Call acquire_writer() before
+    writing; instances that don't get the lock should only load.
+    """
+
+    def __init__(self, settings: KnowledgeSnapshotSettings):
+        self.settings = settings
+        self.directory = settings.snapshot_dir
+        self._lock_file = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    @property
+    def writable(self) -> bool:
+        return self._lock_file is not None
+
+    def acquire_writer(self) -> bool:
+        """Take the directory's writer lock, unless configured as read-only or another process holds it."""
+        if not self.enabled or not self.settings.snapshot_writer:
+            return False
+        if self._lock_file is not None:
+            return True
+        os.makedirs(self.directory, exist_ok=True)
+        lock_file = open(os.path.join(self.directory, WRITER_LOCK_FILE), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            logger.warning("Knowledge snapshots in %s are written by another process; loading only", self.directory)
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def release_writer(self):
+        if self._lock_file is not None:
+            # Closing the file drops the lock
+            self._lock_file.close()
+            self._lock_file = None
+
+    def current_path(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.directory, CURRENT_FILE)) as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return os.path.join(self.directory, name)
+
+    def load(self) -> Optional[KnowledgeSnapshot]:
+        path = self.current_path()
+        if path is None:
+            return None
+        try:
+            return KnowledgeSnapshot(path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Ignoring unreadable knowledge snapshot %s: %s", path, e)
+            return None
+
+    def write(self, store: KnowledgeStore) -> KnowledgeSnapshot:
+        """Write a frozen store as a new generation and make it current.
+
+        Safe to run in a worker thread as long as ``store`` comes from freeze().
+        """
+        if not self.writable:
+            raise RuntimeError("acquire_writer() must succeed before writing snapshots")
+        name = f"snapshot-{datetime.utcnow().strftime('%Y%m%d%H%M%S%f')}"
+        path = os.path.join(self.directory, name)
+        try:
+            write_snapshot(path, len(store), store.iter_records())
+        except Exception:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+
+        pointer = os.path.join(self.directory, CURRENT_FILE)
+        with open(pointer + ".tmp", "w") as f:
+            f.write(name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(pointer + ".tmp", pointer)
+
+        self._prune()
+        return KnowledgeSnapshot(path)
+
+    def _prune(self):
+        generations = sorted(
+            name for name in os.listdir(self.directory) if name.startswith("snapshot-")
+        )
+        for name in generations[:-self.settings.keep_generations]:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
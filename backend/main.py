@@ -1,10 +1,30 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import uuid
 from datetime import datetime
 import json
+import asyncio
+import logging
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from aws_clients import (
+    AWSClientManager,
+    AWSClientSettings,
+    CircuitOpenError,
+    DASHBOARD_ANALYSIS_MODEL,
+    LOG_ANALYSIS_MODEL,
+    METRICS_ANALYSIS_MODEL,
+    SUPERVISOR_MODEL,
+)
+from context_builder import BuiltContext, ContextBuilder, ContextSettings, detect_anomaly_window
+from knowledge_store import KnowledgeSnapshotManager, KnowledgeSnapshotSettings, KnowledgeStore
+from analysis_archive import AnalysisArchive, AnalysisArchiveSettings
+
+logger = logging.getLogger(__name__)
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -82,8 +102,27 @@ class KnowledgeBaseEntry(KnowledgeBaseEntryBase):
 
 # Mock database
 incidents_db = {}
-analyses_db = {}
-knowledge_db = {}
+# Inputs and results are stored compressed and shared between analyses
+analyses_db = AnalysisArchive(Analysis, AnalysisArchiveSettings())
+knowledge_db = KnowledgeStore(KnowledgeBaseEntry)
+
+# Knowledge base snapshots; only written when SRE_KB_SNAPSHOT_DIR is set
+kb_snapshot_settings = KnowledgeSnapshotSettings()
+kb_snapshots = KnowledgeSnapshotManager(kb_snapshot_settings)
+
+# Shared AWS clients; only started when SRE_AWS_ENABLED is set
+aws_settings = AWSClientSettings()
+aws_clients = AWSClientManager(aws_settings)
+context_builder = ContextBuilder(ContextSettings())
+
+async def call_aws(coro):
+    """Await an AWS call, mapping client-layer failures to HTTP errors"""
+    try:
+        return await coro
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
+    except (ClientError, BotoCoreError) as e:
+        raise HTTPException(status_code=502, detail=f"AWS request failed: {e}")
 
 # Incident endpoints
 @app.get("/api/v1/incidents", response_model=List[Incident])
@@ -188,20 +227,12 @@ async def create_analysis(analysis: AnalysisCreate):
 # Knowledge Base endpoints
 @app.get("/api/v1/knowledge", response_model=List[KnowledgeBaseEntry])
 async def search_knowledge_base(query: Optional[str] = None):
-    entries = list(knowledge_db.values())
-    
     if query:
-        # In a real implementation, this would use vector similarity search
-        # For now, we'll do a simple text search
-        filtered_entries = []
-        for entry in entries:
-            if (query.lower() in entry.title.lower() or 
-                query.lower() in entry.description.lower() or
-                query.lower() in entry.root_cause.lower()):
-                filtered_entries.append(entry)
-        return filtered_entries
+        # Text search over title, description and root cause, narrowed by the trigram index.
+        # Short queries scan the whole text column, so keep them off the event loop.
+        return await run_in_threadpool(knowledge_db.search, query)
     
-    return entries
+    return list(knowledge_db.values())
 
 @app.get("/api/v1/knowledge/{entry_id}", response_model=KnowledgeBaseEntry)
 async def get_knowledge_base_entry(entry_id: str):
@@ -209,6 +240,15 @@ async def get_knowledge_base_entry(entry_id: str):
         raise HTTPException(status_code=404, detail="Knowledge base entry not found")
     return knowledge_db[entry_id]
 
+@app.get("/api/v1/knowledge/{entry_id}/similar")
+async def get_similar_knowledge_base_entries(entry_id: str, limit: int = Query(5, ge=1, le=50)):
+    if entry_id not in knowledge_db:
+        raise HTTPException(status_code=404, detail="Knowledge base entry not found")
+    return [
+        {"id": entry.id, "title": entry.title, "similarity": round(score, 2)}
+        for entry, score in knowledge_db.similar(entry_id, limit)
+    ]
+
 @app.post("/api/v1/knowledge", response_model=KnowledgeBaseEntry, status_code=status.HTTP_201_CREATED)
 async def create_knowledge_base_entry(entry: KnowledgeBaseEntryCreate):
     entry_id = str(uuid.uuid4())
@@ -259,12 +299,67 @@ class BedrockAnalysisResponse(BaseModel):
     status: str
     result: Optional[Dict[str, Any]] = None
 
+def build_agent_contexts(request: BedrockAnalysisRequest, agents) -> List[BuiltContext]:
+    window = detect_anomaly_window(request.log_data, request.metrics_data)
+    return [
+        context_builder.build(model_id, request.incident_description, {section: data}, anomaly_window=window)
+        for _, model_id, _, section, data in agents
+    ]
+
+async def run_bedrock_analysis(request: BedrockAnalysisRequest) -> Dict[str, Any]:
+    agents = [
+        ("log_analysis", LOG_ANALYSIS_MODEL, "Claude 3 Haiku", "logs", request.log_data),
+        ("metrics_analysis", METRICS_ANALYSIS_MODEL, "Amazon Titan Text", "metrics", request.metrics_data),
+        ("dashboard_analysis", DASHBOARD_ANALYSIS_MODEL, "Amazon Nova Lite", "dashboard", request.dashboard_data),
+    ]
+    agents = [agent for agent in agents if agent[4]]
+
+    # Ranking large inputs is CPU-bound, so keep it off the event loop
+    contexts = await run_in_threadpool(build_agent_contexts, request, agents)
+
+    # The specialised agents are independent, so run them concurrently
+    summaries = await asyncio.gather(*(
+        call_aws(aws_clients.invoke_model(
+            model_id,
+            context.render(f"Identify key findings in the following {section}.")
+        ))
+        for (_, model_id, _, section, _), context in zip(agents, contexts)
+    ))
+
+    result = {
+        key: {"model": model_name, "summary": summary}
+        for (key, _, model_name, _, _), summary in zip(agents, summaries)
+    }
+    findings = "\n\n".join(f"{key}:\n{value['summary']}" for key, value in result.items())
+    supervisor_context = context_builder.build(
+        SUPERVISOR_MODEL, request.incident_description, {"findings": findings}
+    )
+    supervisor_summary = await call_aws(aws_clients.invoke_model(
+        SUPERVISOR_MODEL,
+        supervisor_context.render("Determine the root cause from these agent findings.")
+    ))
+    result["supervisor_analysis"] = {"model": "Amazon Nova Pro", "summary": supervisor_summary}
+
+    # Record what each prompt kept and dropped to fit its token budget
+    result["context"] = {
+        key: context.report.dict()
+        for (key, _, _, _, _), context in zip(agents, contexts)
+    }
+    result["context"]["supervisor_analysis"] = supervisor_context.report.dict()
+    return result
+
 @app.post("/api/v1/bedrock/analyze", response_model=BedrockAnalysisResponse)
 async def analyze_with_bedrock(request: BedrockAnalysisRequest):
-    # In a real implementation, this would call AWS Bedrock models
-    # For now, we'll simulate a response
-    
     analysis_id = str(uuid.uuid4())
+
+    if aws_clients.started:
+        return BedrockAnalysisResponse(
+            analysis_id=analysis_id,
+            status="completed",
+            result=await run_bedrock_analysis(request)
+        )
+
+    # Without AWS configured, we'll simulate a response
     
     # Mock result from AWS Bedrock
     mock_result = {
@@ -321,8 +416,34 @@ class CloudWatchMetricsRequest(BaseModel):
 
 @app.post("/api/v1/aws/cloudwatch/metrics")
 async def get_cloudwatch_metrics(request: CloudWatchMetricsRequest):
-    # In a real implementation, this would call CloudWatch API
-    # For now, we'll return mock data
+    dimensions = [{"Name": k, "Value": v} for k, v in request.dimensions.items()]
+
+    if aws_clients.started:
+        response = await call_aws(aws_clients.get_metric_statistics(
+            Namespace=request.namespace,
+            MetricName=request.metric_name,
+            Dimensions=dimensions,
+            StartTime=request.start_time,
+            EndTime=request.end_time,
+            Period=request.period,
+            Statistics=[request.statistic],
+        ))
+        datapoints = sorted(response.get("Datapoints", []), key=lambda point: point["Timestamp"])
+        return {
+            "Namespace": request.namespace,
+            "MetricName": request.metric_name,
+            "Dimensions": dimensions,
+            "Datapoints": [
+                {
+                    "Timestamp": point["Timestamp"].isoformat(),
+                    "Value": point.get(request.statistic),
+                    "Unit": point.get("Unit")
+                }
+                for point in datapoints
+            ]
+        }
+
+    # Without AWS configured, we'll return mock data
     
     # Generate mock time series data
     start_timestamp = int(request.start_time.timestamp())
@@ -360,14 +481,17 @@ async def get_cloudwatch_metrics(request: CloudWatchMetricsRequest):
     return {
         "Namespace": request.namespace,
         "MetricName": request.metric_name,
-        "Dimensions": [{"Name": k, "Value": v} for k, v in request.dimensions.items()],
+        "Dimensions": dimensions,
         "Datapoints": datapoints
     }
 
 # Health check endpoint
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "version": "1.0.0"}
+    health = {"status": "healthy", "version": "1.0.0"}
+    if aws_clients.started:
+        health["aws"] = aws_clients.snapshot()
+    return health
 
 # Add some sample data
 def add_sample_data():
@@ -435,14 +559,61 @@ def add_sample_data():
         }
     ]
     
-    for entry in knowledge_entries:
-        entry_id = entry.pop("id")
-        knowledge_db[entry_id] = KnowledgeBaseEntry(id=entry_id, **entry)
+    # A restored snapshot already holds the sample entries, or the user's edits to them
+    if knowledge_db.snapshot is None:
+        for entry in knowledge_entries:
+            entry_id = entry.pop("id")
+            knowledge_db[entry_id] = KnowledgeBaseEntry(id=entry_id, **entry)
+
+# Saves run one at a time, so a later caller waits for the one in flight
+snapshot_lock = asyncio.Lock()
+
+async def save_knowledge_snapshot():
+    async with snapshot_lock:
+        if not kb_snapshots.writable or not knowledge_db.dirty:
+            return
+        frozen = knowledge_db.freeze()
+        try:
+            snapshot = await run_in_threadpool(kb_snapshots.write, frozen)
+        except Exception:
+            knowledge_db.dirty = True
+            logger.exception("Failed to write knowledge base snapshot")
+            return
+        except BaseException:
+            # Cancelled; the frozen writes are not on disk yet
+            knowledge_db.dirty = True
+            raise
+        knowledge_db.swap(snapshot, frozen)
+
+async def snapshot_knowledge_periodically():
+    while True:
+        await asyncio.sleep(kb_snapshot_settings.snapshot_interval)
+        # Shielded so that cancelling this task never interrupts a write
+        await asyncio.shield(save_knowledge_snapshot())
+
+snapshot_task = None
 
 # Add sample data on startup
 @app.on_event("startup")
 async def startup_event():
+    global snapshot_task
+    if kb_snapshots.enabled:
+        # Only opens and memory-maps the files, so this is fast for any corpus size
+        knowledge_db.snapshot = kb_snapshots.load()
+        if kb_snapshots.acquire_writer():
+            snapshot_task = asyncio.create_task(snapshot_knowledge_periodically())
     add_sample_data()
+    if aws_settings.enabled:
+        await aws_clients.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if snapshot_task is not None:
+        snapshot_task.cancel()
+    # Waits for any save already in flight, then writes what it missed
+    await save_knowledge_snapshot()
+    kb_snapshots.release_writer()
+    await aws_clients.close()
 
 if __name__ == "__main__":
     import uvicorn
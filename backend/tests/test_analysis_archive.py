@@ -0,0 +1,114 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel
+
+from analysis_archive import AnalysisArchive, AnalysisArchiveSettings
+
+
+class Analysis(BaseModel):
+    id: str
+    incident_id: str
+    type: str
+    status: str = "completed"
+    created_at: datetime = datetime(2024, 1, 15, 10, 30)
+    log_data: Optional[str] = None
+    metrics_data: Optional[str] = None
+    dashboard_data: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+
+
+def analysis(analysis_id, incident_id="INC-1", log_data="ERROR pool exhausted\n" * 50, result=None):
+    return Analysis(
+        id=analysis_id,
+        incident_id=incident_id,
+        type="log",
+        log_data=log_data,
+        result=result or {"summary": "pool exhausted", "confidence": 0.9},
+    )
+
+
+def make_archive(**settings):
+    return AnalysisArchive(Analysis, AnalysisArchiveSettings(**settings))
+
+
+def test_hot_and_cold_reads_are_identical():
+    result = {"z_last": 1, "a_first": {"when": datetime(2024, 1, 15, 10, 30)}}
+    hot = make_archive()
+    cold = make_archive(hot_tier_bytes=0)
+    hot["a-1"] = cold["a-1"] = analysis("a-1", result=result)
+
+    assert hot["a-1"] == cold["a-1"]
+    # Results come back as JSON would give them, in the original key order
+    assert list(hot["a-1"].result) == ["z_last", "a_first"]
+    assert hot["a-1"].result["a_first"]["when"] == "2024-01-15 10:30:00"
+
+    # Changing a returned result must not leak into later reads
+    for archive in (hot, cold):
+        archive["a-1"].result["a_first"]["when"] = "MUTATED"
+        archive["a-1"].result["z_last"] = 2
+    assert hot["a-1"] == cold["a-1"]
+    assert hot["a-1"].result == {"z_last": 1, "a_first": {"when": "2024-01-15 10:30:00"}}
+
+
+def test_identical_inputs_share_a_blob():
+    archive = make_archive()
+    archive["a-1"] = analysis("a-1")
+    archive["a-2"] = analysis("a-2")
+    # One log blob and one result blob, each referenced twice
+    assert len(archive.blobs) == 2
+
+    archive["a-3"] = analysis("a-3", log_data="WARN slow query\n")
+    assert len(archive.blobs) == 3
+
+
+def test_blobs_are_released_with_their_last_reference():
+    archive = make_archive()
+    archive["a-1"] = analysis("a-1")
+    archive["a-2"] = analysis("a-2")
+    log_digest = archive._records["a-1"].digests["log_data"]
+
+    del archive["a-1"]
+    assert log_digest in archive.blobs
+    assert archive["a-2"].log_data == analysis("a-2").log_data
+
+    del archive["a-2"]
+    assert log_digest not in archive.blobs
+    assert archive.stats() == {"analyses": 0, "blobs": 0, "blob_bytes": 0, "hot_blobs": 0, "hot_bytes": 0}
+
+
+def test_overwriting_an_analysis_releases_its_old_blobs():
+    archive = make_archive()
+    archive["a-1"] = analysis("a-1")
+    archive["a-1"] = analysis("a-1", log_data="WARN slow query\n")
+    assert len(archive) == 1
+    assert len(archive.blobs) == 2
+
+
+def test_retention_drops_oldest_per_incident():
+    archive = make_archive(max_per_incident=3)
+    for i in range(5):
+        archive[f"a-{i}"] = analysis(f"a-{i}", log_data=f"line {i}\n")
+    archive["b-0"] = analysis("b-0", incident_id="INC-2")
+
+    assert sorted(archive) == ["a-2", "a-3", "a-4", "b-0"]
+    # Blobs of evicted analyses are gone; the shared result blob remains
+    assert len(archive.blobs) == 5
+
+
+def test_retention_caps_total_analyses():
+    archive = make_archive(max_analyses=4)
+    for i in range(6):
+        archive[f"a-{i}"] = analysis(f"a-{i}", incident_id=f"INC-{i}")
+    assert list(archive) == ["a-2", "a-3", "a-4", "a-5"]
+
+
+def test_hot_tier_stays_within_its_budget():
+    archive = make_archive(hot_tier_bytes=400)
+    for i in range(20):
+        archive[f"a-{i}"] = analysis(f"a-{i}", log_data=f"ERROR request {i} failed\n" * 20)
+        assert archive.stats()["hot_bytes"] <= 400
+
+    # Evicted values are still readable from their blobs
+    assert archive["a-0"].log_data == "ERROR request 0 failed\n" * 20
+    assert archive.stats()["hot_bytes"] <= 400
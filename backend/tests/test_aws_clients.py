@@ -0,0 +1,160 @@
+import asyncio
+
+import pytest
+from botocore.exceptions import ClientError
+
+from aws_clients import AWSClientManager, AWSClientSettings, CircuitBreaker, CircuitOpenError
+
+
+def client_error(code, status=400):
+    return ClientError(
+        {"Error": {"Code": code, "Message": code}, "ResponseMetadata": {"HTTPStatusCode": status}},
+        "InvokeModel",
+    )
+
+
+class FakeClient:
+    """Stands in for an aiobotocore client; each call pops the next outcome."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    async def invoke_model(self, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if outcome == "hang":
+            await asyncio.sleep(3600)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def make_manager(outcomes, **settings):
+    settings = {"backoff_base": 0.0, "breaker_reset_timeout": 60.0, **settings}
+    manager = AWSClientManager(AWSClientSettings(**settings))
+    client = FakeClient(outcomes)
+    manager._clients["bedrock-runtime"] = client
+    return manager, client
+
+
+def call(manager):
+    return manager.call("bedrock-runtime", "invoke_model", key="model")
+
+
+def test_breaker_opens_after_threshold_and_rejects():
+    breaker = CircuitBreaker("model", failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_breaker_allows_single_probe_and_closes_on_success():
+    breaker = CircuitBreaker("model", failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.before_call() is True
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.reset_timeout = 60
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.before_call() is False
+
+
+def test_breaker_reopens_when_probe_fails():
+    breaker = CircuitBreaker("model", failure_threshold=5, reset_timeout=0)
+    for _ in range(5):
+        breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.open_count == 2
+
+
+def test_released_probe_lets_next_call_probe():
+    breaker = CircuitBreaker("model", failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.reset_timeout = 60
+    breaker.release_probe()
+    assert breaker.before_call() is True
+
+
+def test_stale_probe_expires_after_reset_timeout():
+    breaker = CircuitBreaker("model", failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    breaker.before_call()
+    # The probe never reports back, but with reset_timeout=0 it is already stale
+    assert breaker.before_call() is True
+
+
+def test_cancelled_probe_does_not_wedge_breaker():
+    async def scenario():
+        manager, _ = make_manager(["hang", {"ok": True}], breaker_failure_threshold=1)
+        breaker = manager.breaker("model")
+        breaker.record_failure()
+        breaker.opened_at -= 120
+
+        probe = asyncio.ensure_future(call(manager))
+        await asyncio.sleep(0)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        assert await call(manager) == {"ok": True}
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(scenario())
+
+
+def test_throttling_is_retried_until_success():
+    async def scenario():
+        manager, client = make_manager([client_error("ThrottlingException", 429), {"ok": True}])
+        assert await call(manager) == {"ok": True}
+        assert client.calls == 2
+        assert manager.stats["retries"] == 1
+        assert manager.breaker("model").failures == 0
+
+    asyncio.run(scenario())
+
+
+def test_client_errors_are_not_retried_and_count_as_healthy():
+    async def scenario():
+        manager, client = make_manager([client_error("ValidationException")])
+        with pytest.raises(ClientError):
+            await call(manager)
+        assert client.calls == 1
+        assert manager.breaker("model").state == CircuitBreaker.CLOSED
+
+    asyncio.run(scenario())
+
+
+def test_retries_stop_when_quota_is_spent():
+    async def scenario():
+        errors = [client_error("InternalServerException", 500)] * 4
+        manager, client = make_manager(errors, retry_quota=5, retry_cost=5, breaker_failure_threshold=10)
+        with pytest.raises(ClientError):
+            await call(manager)
+        # One retry spends the whole quota, so the second failure is final
+        assert client.calls == 2
+        assert manager.stats["failures"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_open_breaker_stops_retries():
+    async def scenario():
+        errors = [client_error("InternalServerException", 500)] * 4
+        manager, client = make_manager(errors, breaker_failure_threshold=2)
+        with pytest.raises(ClientError):
+            await call(manager)
+        assert client.calls == 2
+        with pytest.raises(CircuitOpenError):
+            await call(manager)
+        assert manager.stats["rejected"] == 1
+
+    asyncio.run(scenario())
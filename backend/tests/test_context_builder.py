@@ -0,0 +1,54 @@
+import json
+from datetime import datetime
+
+from context_builder import ContextBuilder, ContextSettings, detect_anomaly_window, summarize_metrics
+
+
+def build(sections, budget=8000):
+    builder = ContextBuilder(ContextSettings(default_budget=budget))
+    return builder.build("model", "checkout is failing", sections)
+
+
+def test_distinct_lines_are_kept_when_they_fit():
+    logs = "\n".join([
+        "2024-01-15T10:30:00Z INFO GET /orders status=200 latency=120ms",
+        "2024-01-15T10:30:01Z INFO GET /orders status=503 latency=2300ms",
+        "2024-01-15T10:30:02Z ERROR connection refused to 'orders-db'",
+        "2024-01-15T10:30:03Z ERROR connection refused to 'users-db'",
+    ])
+    context = build({"logs": logs})
+    assert context.sections["logs"] == logs
+    assert context.report.sections["logs"].collapsed_lines == 0
+
+
+def test_repeated_lines_collapse_only_when_over_budget():
+    lines = [f"2024-01-15T10:{i // 60:02d}:{i % 60:02d}Z ERROR request {1000 + i} took 12.5ms" for i in range(400)]
+    lines.append("2024-01-15T10:06:41Z INFO GET /health status=200")
+
+    fits = build({"logs": "\n".join(lines)})
+    assert fits.report.sections["logs"].collapsed_lines == 0
+    assert fits.report.sections["logs"].kept_lines == 401
+
+    tight = ContextBuilder(ContextSettings(default_budget=500)).build(
+        "model", "checkout is failing", {"logs": "\n".join(lines)},
+        anomaly_window=(datetime(2024, 1, 15, 10, 4), datetime(2024, 1, 15, 10, 4, 5)),
+    )
+    kept = tight.sections["logs"].splitlines()
+    assert tight.report.sections["logs"].collapsed_lines == 399
+    # The most severe member wins; among equals, the one inside the anomaly window
+    assert kept[0].startswith("2024-01-15T10:04:00Z ERROR request 1240 took 12.5ms [x400 similar]")
+    assert "status=200" in kept[1]
+
+
+def test_metrics_with_non_dict_datapoints_fall_back_to_lines():
+    metrics = json.dumps({"MetricName": "CPUUtilization", "Datapoints": [1, 2]})
+    assert summarize_metrics(metrics) == [metrics]
+    assert detect_anomaly_window(metrics_data=metrics) is None
+    context = build({"metrics": metrics})
+    assert context.report.sections["metrics"].kept_lines == 1
+
+
+def test_empty_metrics_list_is_reported():
+    context = build({"metrics": "[]"})
+    assert context.sections["metrics"] == "[]"
+    assert context.report.sections["metrics"].kept_lines == 1
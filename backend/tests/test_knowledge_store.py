@@ -0,0 +1,208 @@
+import asyncio
+import json
+import os
+import threading
+from typing import List
+
+from pydantic import BaseModel
+
+import main
+from knowledge_store import KnowledgeSnapshotManager, KnowledgeSnapshotSettings, KnowledgeStore, matches_query
+
+
+class Entry(BaseModel):
+    id: str
+    title: str
+    description: str
+    root_cause: str
+    resolution: str = ""
+    services: List[str] = []
+    tags: List[str] = []
+
+
+def entry(entry_id, title, root_cause="unknown"):
+    return Entry(id=entry_id, title=title, description=f"{title} seen in production", root_cause=root_cause)
+
+
+def manager_for(tmp_path, **settings):
+    manager = KnowledgeSnapshotManager(KnowledgeSnapshotSettings(snapshot_dir=str(tmp_path), **settings))
+    assert manager.acquire_writer()
+    return manager
+
+
+def save(store, manager):
+    frozen = store.freeze()
+    store.swap(manager.write(frozen), frozen)
+
+
+def test_snapshot_round_trip(tmp_path):
+    manager = manager_for(tmp_path)
+    store = KnowledgeStore(Entry)
+    for i in range(50):
+        store[f"kb-{i}"] = entry(f"kb-{i}", f"Database timeout {i}", "connection pool exhausted")
+    save(store, manager)
+
+    restored = KnowledgeStore(Entry)
+    restored.snapshot = manager.load()
+    assert len(restored) == 50
+    assert list(restored) == list(store)
+    assert restored["kb-7"] == store["kb-7"]
+    assert "kb-50" not in restored
+
+
+def test_empty_store_round_trip(tmp_path):
+    manager = manager_for(tmp_path)
+    save(KnowledgeStore(Entry), manager)
+
+    restored = KnowledgeStore(Entry)
+    restored.snapshot = manager.load()
+    assert len(restored) == 0
+    assert restored.search("timeout") == []
+
+
+def test_swap_keeps_writes_made_after_freeze(tmp_path):
+    manager = manager_for(tmp_path)
+    store = KnowledgeStore(Entry)
+    store["kb-1"] = entry("kb-1", "Disk full")
+    store["kb-2"] = entry("kb-2", "Cache stampede")
+    frozen = store.freeze()
+    assert not store.dirty
+
+    # Writes racing the background snapshot write
+    store["kb-1"] = entry("kb-1", "Disk full on /var")
+    store["kb-3"] = entry("kb-3", "DNS outage")
+    del store["kb-2"]
+    store.swap(manager.write(frozen), frozen)
+
+    assert store.dirty
+    assert store["kb-1"].title == "Disk full on /var"
+    assert "kb-2" not in store
+    assert sorted(store) == ["kb-1", "kb-3"]
+
+    save(store, manager)
+    restored = KnowledgeStore(Entry)
+    restored.snapshot = manager.load()
+    assert sorted(restored) == ["kb-1", "kb-3"]
+    assert restored["kb-1"].title == "Disk full on /var"
+
+
+def test_search_matches_full_scan(tmp_path):
+    manager = manager_for(tmp_path)
+    store = KnowledgeStore(Entry)
+    for i in range(200):
+        cause = "connection pool exhausted" if i % 3 else "memory leak in worker"
+        store[f"kb-{i}"] = entry(f"kb-{i}", f"Incident {i}", cause)
+    save(store, manager)
+    store["kb-new"] = entry("kb-new", "Pool exhausted again", "Connection Pool Exhausted")
+
+    for query in ("pool exhausted", "LEAK", "incident 1", "zz", "no such text", "e", "1", "Ak", "d\0c"):
+        expected = {entry_id for entry_id in store if matches_query(store[entry_id], query)}
+        assert {result.id for result in store.search(query)} == expected
+
+
+def test_short_query_does_not_decode_every_record(tmp_path, monkeypatch):
+    manager = manager_for(tmp_path)
+    store = KnowledgeStore(Entry)
+    for i in range(100):
+        store[f"kb-{i}"] = entry(f"kb-{i}", f"Database timeout {i}", "connection pool exhausted")
+    save(store, manager)
+
+    decoded = []
+    raw_record = store.snapshot.raw_record
+    monkeypatch.setattr(store.snapshot, "raw_record", lambda row: decoded.append(row) or raw_record(row))
+    assert store.search("qx") == []
+    assert decoded == []
+    assert [result.id for result in store.search("99")] == ["kb-99"]
+    assert len(decoded) == 1
+
+
+def test_version_1_snapshot_is_still_searchable(tmp_path):
+    manager = manager_for(tmp_path)
+    store = KnowledgeStore(Entry)
+    store["kb-1"] = entry("kb-1", "Disk full")
+    store["kb-2"] = entry("kb-2", "DNS outage")
+    save(store, manager)
+
+    # Generations written before the search text column existed
+    path = manager.current_path()
+    os.remove(os.path.join(path, "search_text.bin"))
+    os.remove(os.path.join(path, "search_offsets.npy"))
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    with open(os.path.join(path, "manifest.json"), "w") as f:
+        json.dump({**manifest, "version": 1}, f)
+
+    restored = KnowledgeStore(Entry)
+    restored.snapshot = manager.load()
+    assert [result.id for result in restored.search("dn")] == ["kb-2"]
+    assert [result.id for result in restored.search("disk")] == ["kb-1"]
+
+
+def test_similar_respects_limit_and_overlay(tmp_path):
+    manager = manager_for(tmp_path)
+    store = KnowledgeStore(Entry)
+    for i in range(20):
+        store[f"kb-{i}"] = entry(f"kb-{i}", f"Database timeout {i}", "connection pool exhausted")
+    store["kb-other"] = entry("kb-other", "Certificate expired", "renewal job failed")
+    save(store, manager)
+    del store["kb-3"]
+
+    results = store.similar("kb-0", limit=5)
+    ids = [result.id for result, _ in results]
+    assert len(ids) == 5
+    assert "kb-0" not in ids and "kb-3" not in ids and "kb-other" not in ids
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_second_writer_is_read_only(tmp_path):
+    first = manager_for(tmp_path)
+    second = KnowledgeSnapshotManager(KnowledgeSnapshotSettings(snapshot_dir=str(tmp_path)))
+    assert not second.acquire_writer()
+    assert not second.writable
+
+    first.release_writer()
+    assert second.acquire_writer()
+    configured_read_only = KnowledgeSnapshotManager(
+        KnowledgeSnapshotSettings(snapshot_dir=str(tmp_path), snapshot_writer=False)
+    )
+    assert not configured_read_only.acquire_writer()
+
+
+def test_shutdown_waits_for_in_flight_save(tmp_path, monkeypatch):
+    manager = manager_for(tmp_path)
+    store = KnowledgeStore(Entry)
+    monkeypatch.setattr(main, "kb_snapshots", manager)
+    monkeypatch.setattr(main, "knowledge_db", store)
+    monkeypatch.setattr(main, "snapshot_lock", asyncio.Lock())
+    monkeypatch.setattr(main.kb_snapshot_settings, "snapshot_interval", 0)
+
+    started = threading.Event()
+    release = threading.Event()
+    write = manager.write
+
+    def slow_write(frozen):
+        started.set()
+        release.wait(5)
+        return write(frozen)
+
+    monkeypatch.setattr(manager, "write", slow_write)
+
+    async def scenario():
+        store["kb-1"] = entry("kb-1", "Disk full")
+        main.snapshot_task = asyncio.create_task(main.snapshot_knowledge_periodically())
+        while not started.is_set():
+            await asyncio.sleep(0.01)
+        # Written while the periodic save is in flight, so only the final save has it
+        store["kb-2"] = entry("kb-2", "DNS outage")
+        asyncio.get_running_loop().call_later(0.05, release.set)
+        await main.shutdown_event()
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        main.snapshot_task = None
+
+    restored = KnowledgeStore(Entry)
+    restored.snapshot = KnowledgeSnapshotManager(KnowledgeSnapshotSettings(snapshot_dir=str(tmp_path))).load()
+    assert sorted(restored) == ["kb-1", "kb-2"]
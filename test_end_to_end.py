@@ -177,7 +177,20 @@ def test_knowledge_api():
         response.raise_for_status()
         search_results = response.json()
         print(f"✅ Successfully searched knowledge base with query 'updated', found {len(search_results)} results")
-        
+
+        # Find similar entries
+        response = requests.get(f"{BACKEND_URL}/api/v1/knowledge/{created_entry['id']}/similar?limit=3")
+        response.raise_for_status()
+        similar_entries = response.json()
+        assert len(similar_entries) <= 3, "Similar entries exceed the requested limit"
+        assert all(item["id"] != created_entry["id"] for item in similar_entries), "Entry listed as similar to itself"
+        print(f"✅ Successfully found {len(similar_entries)} entries similar to {created_entry['id']}")
+
+        # Out-of-range limits are rejected
+        response = requests.get(f"{BACKEND_URL}/api/v1/knowledge/{created_entry['id']}/similar?limit=0")
+        assert response.status_code == 422, f"Expected 422 for limit=0, got {response.status_code}"
+        print("✅ Successfully rejected an invalid similar-entries limit")
+
         # Delete the entry
         response = requests.delete(f"{BACKEND_URL}/api/v1/knowledge/{created_entry['id']}")
         response.raise_for_status()